@@ -5,26 +5,71 @@ It identifies potentially risky changes and provides security recommendations.
 """
 
 import argparse
-import json
-from textwrap import dedent
+import asyncio
+import copy
+import functools
+import os
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import orjson
 from pydantic import BaseModel, Field
+from pydantic.json_schema import SkipJsonSchema
 
 from llm_interface import LLMInterface, llm_from_config
-from tfsec.parse import run_terraform_plan, create_resource_changes_dict, load_plan_result
+from tfsec.cache import AnalysisCache, cache_key
+from tfsec.parse import (
+    STREAMING_AVAILABLE,
+    TerraformPlanResult,
+    run_terraform_plan,
+    run_terraform_plan_async,
+    create_resource_changes_dict,
+    load_plan_result,
+    filter_security_relevant,
+    deduplicate_changes,
+)
+
+
+# Maximum number of directories analyzed by the LLM at the same time
+MAX_CONCURRENT_ANALYSES = 8
+
+_SCHEMA_CACHE: Dict[Any, Dict[str, Any]] = {}
+
+
+class CachedSchemaModel(BaseModel):
+    """
+    Base model that generates its JSON schema only once.
+
+    llm_interface derives the JSON schema of the output model on every request,
+    e.g. to pass it to Ollama as structured output format. Generating the schema
+    walks the whole core schema, while copying the memoized result is cheap.
+    """
 
+    @classmethod
+    def model_json_schema(cls, *args, **kwargs) -> Dict[str, Any]:
+        key = (cls, args, tuple(sorted(kwargs.items())))
+        schema = _SCHEMA_CACHE.get(key)
+        if schema is None:
+            schema = _SCHEMA_CACHE[key] = super().model_json_schema(*args, **kwargs)
+        # Callers are free to modify the schema they get
+        return copy.deepcopy(schema)
 
-class SecurityIssue(BaseModel):
+
+class SecurityIssue(CachedSchemaModel):
     """Represents a single security issue found in the changes."""
     severity: str = Field(..., description="Severity level: HIGH, MEDIUM, or LOW")
     resource: str = Field(..., description="The Terraform resource identifier")
     issue: str = Field(..., description="Brief description of the security issue")
     explanation: str = Field(..., description="Detailed explanation of the security implications")
     recommendation: str = Field(..., description="Recommended remediation steps")
+    # Filled in after the analysis, so it is hidden from the LLM's output schema
+    affected_resources: SkipJsonSchema[List[str]] = Field(
+        default_factory=list,
+        description="All resources with changes identical to the analyzed resource"
+    )
 
 
-class SecurityAnalysis(BaseModel):
+class SecurityAnalysis(CachedSchemaModel):
     """Contains the full security analysis of Terraform changes."""
     issues: List[SecurityIssue] = Field(
         default_factory=list,
@@ -34,13 +79,25 @@ class SecurityAnalysis(BaseModel):
         "",
         description="Overall summary of the security analysis in markdown format"
     )
+    # Filled in when merging the groups of a batched analysis
+    unanalyzed_resources: SkipJsonSchema[List[str]] = Field(
+        default_factory=list,
+        description="Resources whose group could not be analyzed"
+    )
 
 
-SECURITY_ANALYSIS_PROMPT = dedent("""You are a cloud security expert specializing in Terraform infrastructure-as-code security analysis. Your task is to thoroughly analyze the security implications of proposed Terraform infrastructure changes and structure your findings according to the provided schema.
+class SecuritySummary(CachedSchemaModel):
+    """Executive summary synthesized from the issues of several analyses."""
+    summary: str = Field(
+        ...,
+        description="Overall summary of the security analysis in markdown format"
+    )
 
-Please examine the following Terraform plan output and identify potential security issues:
 
-{changes}
+# The static instructions form the prefix of the prompt and the variable part
+# comes last, so providers and local runtimes that reuse the KV cache of a
+# shared prompt prefix only need to process the changes on every call.
+SECURITY_ANALYSIS_PROMPT = """You are a cloud security expert specializing in Terraform infrastructure-as-code security analysis. Your task is to thoroughly analyze the security implications of proposed Terraform infrastructure changes and structure your findings according to the provided schema.
 
 For each security issue you find:
 1. Create a SecurityIssue object with:
@@ -63,9 +120,59 @@ Consider these key areas in your analysis:
 - Resource exposure (public accessibility, OS hardening)
 - Compliance with security best practices and standards
 
-Format your response according to the SecurityAnalysis schema, with individual findings as SecurityIssue objects in the issues list, and a brief executive summary in the summary field.""").strip()
+Format your response according to the SecurityAnalysis schema, with individual findings as SecurityIssue objects in the issues list, and a brief executive summary in the summary field.
+
+Please examine the following Terraform plan output and identify potential security issues:
+
+{changes}"""
 
 
+SECURITY_SUMMARY_PROMPT = """You are a cloud security expert specializing in Terraform infrastructure-as-code security analysis. The proposed Terraform changes were analyzed in several batches and you are given the security issues that were identified.
+
+Write a brief overview of these findings that includes:
+1. The total number of issues found by severity
+2. The highest-risk areas that need immediate attention
+3. A general assessment of the overall security impact
+Keep the summary concise (3-5 sentences) as the details are already in the issues.
+
+Format your response according to the SecuritySummary schema.
+
+The identified security issues are:
+
+{issues}"""
+
+# Generate the output schemas at import, before any sharded analysis needs them
+for _output_schema in (SecurityAnalysis, SecuritySummary):
+    _output_schema.model_json_schema()
+del _output_schema
+
+
+def cached_analysis(func: Callable[[LLMInterface, Dict], Optional[SecurityAnalysis]]):
+    """
+    Serve the analysis from an AnalysisCache when one is passed as cache.
+
+    The cache key covers the prompt, the provider, the model and the changes
+    serialized with sorted keys, so requests that only differ in the order of
+    resources or attributes share an entry. The provider is identified by the
+    type of the LLMInterface's client. Failed analyses are not cached.
+    """
+    @functools.wraps(func)
+    def wrapper(llm: LLMInterface, changes: Dict, cache: Optional[AnalysisCache] = None) -> Optional[SecurityAnalysis]:
+        if cache is None:
+            return func(llm, changes)
+
+        key = cache_key(SECURITY_ANALYSIS_PROMPT, type(llm.client).__name__, str(llm.model_name), changes)
+        analysis = cache.get(key, SecurityAnalysis)
+        if analysis is None:
+            analysis = func(llm, changes)
+            if analysis is not None:
+                cache.set(key, analysis)
+        return analysis
+
+    return wrapper
+
+
+@cached_analysis
 def analyze_changes(llm: LLMInterface, changes: Dict) -> Optional[SecurityAnalysis]:
     """
     Analyze Terraform changes for security implications using an LLM.
@@ -78,7 +185,7 @@ def analyze_changes(llm: LLMInterface, changes: Dict) -> Optional[SecurityAnalys
         SecurityAnalysis object containing identified issues and recommendations
     """
     # Format changes for the prompt
-    changes_str = json.dumps(changes, indent=2)
+    changes_str = orjson.dumps(changes, option=orjson.OPT_INDENT_2).decode()
     
     # Generate security analysis using the LLM
     analysis = llm.generate_pydantic(
@@ -91,72 +198,440 @@ def analyze_changes(llm: LLMInterface, changes: Dict) -> Optional[SecurityAnalys
     return analysis
 
 
+def shard_changes(changes: Dict, batch_size: int) -> Iterator[Dict]:
+    """
+    Split Terraform changes into groups of at most batch_size resources.
+
+    Args:
+        changes: Dictionary of Terraform resource changes
+        batch_size: Maximum number of resources per group
+
+    Yields:
+        Dictionaries in the same format as changes, each holding one group
+    """
+    items = list(changes["changes"].items())
+    for start in range(0, len(items), batch_size):
+        yield {"changes": dict(items[start:start + batch_size])}
+
+
+def summarize_issues(llm: LLMInterface, issues: List[SecurityIssue]) -> Optional[str]:
+    """
+    Synthesize an executive summary for issues gathered from several analyses.
+
+    Args:
+        llm: LLMInterface instance for generating the summary
+        issues: Security issues to summarize
+
+    Returns:
+        The summary in markdown format, or None if generation failed
+    """
+    if not issues:
+        return "No security issues were identified in the proposed changes."
+
+    # Only the headline of each issue is needed to summarize them
+    issues_str = orjson.dumps(
+        [issue.model_dump(include={"severity", "resource", "issue"}) for issue in issues],
+        option=orjson.OPT_INDENT_2
+    ).decode()
+
+    summary = llm.generate_pydantic(
+        prompt_template=SECURITY_SUMMARY_PROMPT,
+        output_schema=SecuritySummary,
+        issues=issues_str,
+        temperature=0.2
+    )
+
+    return summary.summary if summary else None
+
+
+def count_issues(issues: List[SecurityIssue]) -> str:
+    """
+    Summarize issues by counting them per severity, without an LLM call.
+
+    Args:
+        issues: Security issues to summarize
+
+    Returns:
+        The summary in markdown format
+    """
+    counts: Dict[str, int] = {}
+    for issue in issues:
+        severity = issue.severity.upper()
+        counts[severity] = counts.get(severity, 0) + 1
+    lines = [f"Found {len(issues)} security issue{'s' if len(issues) != 1 else ''}:"]
+    lines.extend(f"- {severity}: {count}" for severity, count in counts.items())
+    return "\n".join(lines)
+
+
+def merge_analyses(llm: LLMInterface, shards: List[Dict],
+                   analyses: List[Optional[SecurityAnalysis]]) -> Optional[SecurityAnalysis]:
+    """
+    Merge the analyses of several shards into a single SecurityAnalysis.
+
+    Shards that failed to be analyzed do not discard the others, their
+    resources are listed in unanalyzed_resources instead.
+
+    Args:
+        llm: LLMInterface instance for generating the combined summary
+        shards: The shards as returned by shard_changes
+        analyses: Analyses of the individual shards, None for failed shards
+
+    Returns:
+        Combined SecurityAnalysis, or None if no shard could be analyzed. If
+        the summary cannot be generated, the issues are only counted instead.
+    """
+    succeeded = [analysis for analysis in analyses if analysis is not None]
+    if not succeeded:
+        return None
+
+    unanalyzed: List[str] = []
+    for shard, analysis in zip(shards, analyses):
+        if analysis is None:
+            unanalyzed.extend(shard["changes"])
+
+    if len(analyses) == 1:
+        return succeeded[0]
+
+    issues: List[SecurityIssue] = []
+    for analysis in succeeded:
+        issues.extend(analysis.issues)
+
+    summary = summarize_issues(llm, issues)
+    if summary is None:
+        summary = count_issues(issues)
+
+    return SecurityAnalysis(issues=issues, summary=summary, unanalyzed_resources=unanalyzed)
+
+
+def analyze_changes_batched(llm: LLMInterface, changes: Dict, batch_size: int = 8,
+                            cache: Optional[AnalysisCache] = None,
+                            on_analysis: Optional[Callable[[SecurityAnalysis], None]] = None) -> Optional[SecurityAnalysis]:
+    """
+    Analyze Terraform changes in groups of batch_size resources.
+
+    Each group is analyzed with its own, much smaller prompt so that a failed
+    response only loses the analysis of that group. The issues of all groups
+    that succeeded are merged and a short final LLM call summarizes them.
+
+    Args:
+        llm: LLMInterface instance for generating security analysis
+        changes: Dictionary of Terraform resource changes
+        batch_size: Maximum number of resources per LLM call
+        cache: Optional AnalysisCache consulted for every group
+        on_analysis: Optional callback receiving the analysis of each group as soon as it is done
+
+    Returns:
+        SecurityAnalysis object containing identified issues and recommendations,
+        or None if no group could be analyzed
+    """
+    shards = list(shard_changes(changes, batch_size))
+    analyses = []
+    for shard in shards:
+        analysis = analyze_changes(llm, shard, cache=cache)
+        if analysis is not None and on_analysis is not None:
+            on_analysis(analysis)
+        analyses.append(analysis)
+    return merge_analyses(llm, shards, analyses)
+
+
+def _normalize_address(address: str) -> str:
+    """Normalize the formatting of a resource address returned by the LLM."""
+    address = "".join(address.split()).strip("`")
+    return address.replace("'", '"')
+
+
+def _find_group(address: str, groups: Dict[str, List[str]]) -> List[str]:
+    """
+    Find the group of a resource address that may not match its representative exactly.
+
+    Args:
+        address: Resource address as returned by the LLM
+        groups: Addresses of all resources per representative as returned by deduplicate_changes
+
+    Returns:
+        Addresses of the group, or an empty list if no unique group matches
+    """
+    if address in groups:
+        return groups[address]
+
+    normalized = _normalize_address(address)
+    matches = []
+    for representative, addresses in groups.items():
+        candidate = _normalize_address(representative)
+        # The LLM may also drop the module path of the address
+        if candidate == normalized or candidate.endswith("." + normalized):
+            matches.append(addresses)
+    return matches[0] if len(matches) == 1 else []
+
+
+def expand_duplicates(analysis: SecurityAnalysis, groups: Dict[str, List[str]]) -> SecurityAnalysis:
+    """
+    Attribute the issues found for a representative resource to its whole group.
+
+    Args:
+        analysis: SecurityAnalysis of the deduplicated changes
+        groups: Addresses of all resources per representative as returned by deduplicate_changes
+
+    Returns:
+        SecurityAnalysis whose issues list the affected resources of larger groups
+    """
+    issues = []
+    for issue in analysis.issues:
+        addresses = _find_group(issue.resource, groups)
+        if len(addresses) > 1:
+            issue = issue.model_copy(update={"affected_resources": addresses})
+        issues.append(issue)
+    unanalyzed = []
+    for address in analysis.unanalyzed_resources:
+        unanalyzed.extend(groups.get(address, [address]))
+    return analysis.model_copy(update={"issues": issues, "unanalyzed_resources": unanalyzed})
+
+
+async def analyze_changes_async(llm: LLMInterface, changes: Dict, batch_size: int = 8, concurrency: int = 8,
+                                cache: Optional[AnalysisCache] = None,
+                                on_analysis: Optional[Callable[[SecurityAnalysis], None]] = None) -> Optional[SecurityAnalysis]:
+    """
+    Analyze Terraform changes in groups of batch_size resources concurrently.
+
+    Up to concurrency groups are sent to the LLM at the same time, overlapping
+    the network and decoding latency of the individual requests. Timeouts and
+    invalid responses are retried per group by the LLMInterface.
+
+    Args:
+        llm: LLMInterface instance for generating security analysis
+        changes: Dictionary of Terraform resource changes
+        batch_size: Maximum number of resources per LLM call
+        concurrency: Maximum number of LLM calls in flight, 1 analyzes the groups sequentially
+        cache: Optional AnalysisCache consulted for every group
+        on_analysis: Optional callback receiving the analysis of each group as soon as it is done
+
+    Returns:
+        SecurityAnalysis object containing identified issues and recommendations
+    """
+    if concurrency <= 1:
+        return analyze_changes_batched(llm, changes, batch_size=batch_size, cache=cache, on_analysis=on_analysis)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze_shard(shard: Dict) -> Optional[SecurityAnalysis]:
+        async with semaphore:
+            # LLMInterface is synchronous, so each call blocks a worker thread
+            analysis = await asyncio.to_thread(analyze_changes, llm, shard, cache=cache)
+        if analysis is not None and on_analysis is not None:
+            on_analysis(analysis)
+        return analysis
+
+    shards = list(shard_changes(changes, batch_size))
+    analyses = await asyncio.gather(*(analyze_shard(shard) for shard in shards))
+    return await asyncio.to_thread(merge_analyses, llm, shards, list(analyses))
+
+
+def _analyze_plan_result(llm: LLMInterface, result: TerraformPlanResult, args: argparse.Namespace,
+                         cache: Optional[AnalysisCache]) -> Tuple[int, str, Optional[SecurityAnalysis]]:
+    """
+    Analyze the changes of a terraform plan result as configured on the command line.
+
+    Returns:
+        Exit code, a message explaining why there is no analysis and the analysis if there is one
+    """
+    if result.error:
+        return 1, f"Error: {result.error}", None
+
+    # With -detailed-exitcode, terraform plan only exits with 1 on errors
+    if result.return_code == 1 or (result.changes is None and not result.json_plan):
+        return 1, f"Error: terraform plan failed\n{result.stderr}", None
+        
+    # Extract and analyze changes
+    if result.changes is not None:
+        changes = result.changes
+    else:
+        changes = create_resource_changes_dict(result.json_plan)
+    if not changes:
+        return 0, "No changes detected", None
+
+    # Keep resources without security surface out of the prompt
+    if not args.no_filter:
+        changes = filter_security_relevant(changes)
+        if not changes:
+            return 0, "No security relevant changes detected", None
+
+    # Analyze resources with identical changes only once
+    changes, duplicates = deduplicate_changes(changes)
+
+    # Print the issues of every batch as soon as it has been analyzed
+    on_analysis = None
+    if args.stream_issues:
+        _print_issues_header()
+
+        def on_analysis(batch_analysis: SecurityAnalysis) -> None:
+            for issue in expand_duplicates(batch_analysis, duplicates).issues:
+                _print_issue(issue)
+        
+    # Perform security analysis
+    if args.batch_size:
+        analysis = asyncio.run(analyze_changes_async(
+            llm, {"changes": changes}, batch_size=args.batch_size, concurrency=args.concurrency, cache=cache,
+            on_analysis=on_analysis
+        ))
+    else:
+        analysis = analyze_changes(llm, {"changes": changes}, cache=cache)
+    if not analysis:
+        return 1, "Failed to generate security analysis", None
+
+    analysis = expand_duplicates(analysis, duplicates)
+    if analysis.unanalyzed_resources:
+        return 1, "Failed to analyze some resources", analysis
+    return 0, "", analysis
+
+
+def _print_issues_header() -> None:
+    print("\nDetailed Security Issues")
+    print("=======================\n")
+
+
+def _print_issue(issue: SecurityIssue) -> None:
+    print(f"Severity: {issue.severity}")
+    print(f"Resource: {issue.resource}")
+    if issue.affected_resources:
+        print(f"Affected Resources: {', '.join(issue.affected_resources)}")
+    print(f"Issue: {issue.issue}")
+    print("\nExplanation:")
+    print(issue.explanation)
+    print("\nRecommendation:")
+    print(issue.recommendation)
+    print("\n---\n", flush=True)
+
+
+def _print_analysis(analysis: SecurityAnalysis, include_issues: bool = True) -> None:
+    print("\nSecurity Analysis Summary")
+    print("========================\n")
+    print(analysis.summary)
+    
+    if include_issues and analysis.issues:
+        _print_issues_header()
+        for issue in analysis.issues:
+            _print_issue(issue)
+
+    if analysis.unanalyzed_resources:
+        print("\nNot Analyzed")
+        print("============\n")
+        print("The security analysis failed for these resources:")
+        for address in analysis.unanalyzed_resources:
+            print(f"  - {address}")
+
+
+async def _analyze_directories_async(llm: LLMInterface, args: argparse.Namespace,
+                                     cache: Optional[AnalysisCache]) -> List[Tuple[int, str, Optional[SecurityAnalysis]]]:
+    """Plan and analyze the directories, each directory is analyzed as soon as its plan is done."""
+    # terraform runs in asyncio subprocesses, the blocking LLM calls in worker threads
+    plan_semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+    analysis_semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
+    async def plan_and_analyze(directory: Path) -> Tuple[int, str, Optional[SecurityAnalysis]]:
+        async with plan_semaphore:
+            result = await run_terraform_plan_async(
+                directory, stream_changes=args.stream_plan, parallelism=args.parallelism,
+                force_init=args.force_init
+            )
+        async with analysis_semaphore:
+            return await asyncio.to_thread(_analyze_plan_result, llm, result, args, cache)
+
+    return await asyncio.gather(*(plan_and_analyze(directory) for directory in args.directories))
+
+
+def _analyze_directories(llm: LLMInterface, args: argparse.Namespace, cache: Optional[AnalysisCache]) -> int:
+    """Plan and analyze several Terraform directories concurrently and report on all of them."""
+    return_code = 0
+    analyses = asyncio.run(_analyze_directories_async(llm, args, cache))
+    for directory, (code, message, analysis) in zip(args.directories, analyses):
+        print(f"\n{directory}")
+        print("=" * len(str(directory)))
+        if analysis is None:
+            print(message)
+        else:
+            _print_analysis(analysis)
+        return_code = max(return_code, code)
+
+    return return_code
+
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze Terraform changes for security implications')
     parser.add_argument('--directory', type=Path, help='Directory containing Terraform configuration')
+    parser.add_argument('--directories', type=Path, nargs='+',
+                       help='Plan and analyze several directories containing Terraform configurations')
     parser.add_argument('--state', type=Path, help='Path to Terraform state file')
     parser.add_argument('--plan-file', type=Path, help='Read analysis from saved plan file instead of running terraform')
     parser.add_argument('--provider', default='ollama', choices=['ollama', 'openai', 'anthropic'],
                        help='LLM provider to use')
     parser.add_argument('--model', default='phi4:latest', help='Model name to use')
+    parser.add_argument('--stream-plan', action='store_true',
+                       help='Only extract resource changes while reading the plan (requires ijson)')
+    parser.add_argument('--parallelism', type=int,
+                       help='Concurrent operations of terraform plan (default: 3 times the number of CPUs)')
+    parser.add_argument('--force-init', action='store_true',
+                       help='Run terraform init even if the directory is already initialized')
+    parser.add_argument('--no-filter', action='store_true',
+                       help='Analyze all changes, including resources and attributes without security impact')
+    parser.add_argument('--batch-size', type=int,
+                       help='Analyze at most this many resources per LLM call')
+    parser.add_argument('--concurrency', type=int, default=1,
+                       help='Maximum number of batches analyzed at the same time')
+    parser.add_argument('--stream-issues', action='store_true',
+                       help='Print the issues of each batch as soon as it is analyzed, before the summary')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Do not reuse cached LLM responses, analyses and plan changes')
+    parser.add_argument('--cache-ttl', type=float,
+                       help='Maximum age in seconds of cached analyses to reuse')
     
     args = parser.parse_args()
 
-    if not args.directory and not args.plan_file:
-        parser.error("Either --directory or --plan-file must be specified")
+    if sum(bool(source) for source in (args.directory, args.directories, args.plan_file)) != 1:
+        parser.error("Exactly one of --directory, --directories or --plan-file must be specified")
+    if args.directories and args.state:
+        parser.error("--state cannot be used with --directories")
+    if args.batch_size is not None and args.batch_size < 1:
+        parser.error("--batch-size must be a positive integer")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be a positive integer")
+    if args.concurrency > 1 and not args.batch_size:
+        parser.error("--concurrency requires --batch-size")
+    if args.stream_issues and not args.batch_size:
+        parser.error("--stream-issues requires --batch-size")
+    if args.stream_issues and args.directories:
+        parser.error("--stream-issues cannot be used with --directories")
+    if args.stream_plan and not STREAMING_AVAILABLE:
+        parser.error("--stream-plan requires the ijson package")
 
     # Create LLM interface
     llm = llm_from_config(
         provider=args.provider,
         model_name=args.model,
-        use_cache=True
+        use_cache=not args.no_cache
     )
+    cache = None if args.no_cache else AnalysisCache(ttl=args.cache_ttl)
+
+    if args.directories:
+        return _analyze_directories(llm, args, cache)
     
     # Get Terraform changes
     if args.plan_file:
-        result = load_plan_result(args.plan_file)
+        result = load_plan_result(args.plan_file, use_cache=not args.no_cache)
     else:
-        result = run_terraform_plan(args.directory, args.state)
+        result = run_terraform_plan(
+            args.directory, args.state, stream_changes=args.stream_plan, parallelism=args.parallelism,
+            force_init=args.force_init
+        )
 
-    if result.error:
-        print(f"Error: {result.error}")
-        return 1
-        
-    if not result.json_plan:
-        print("No changes to analyze")
-        return 0
+    return_code, message, analysis = _analyze_plan_result(llm, result, args, cache)
+    if analysis is None:
+        print(message)
+        return return_code
         
-    # Extract and analyze changes
-    changes = create_resource_changes_dict(result.json_plan)
-    if not changes:
-        print("No changes detected")
-        return 0
-        
-    # Perform security analysis
-    analysis = analyze_changes(llm, {"changes": changes})
-    if not analysis:
-        print("Failed to generate security analysis")
-        return 1
-        
-    # Print results
-    print("\nSecurity Analysis Summary")
-    print("========================\n")
-    print(analysis.summary)
-    
-    if analysis.issues:
-        print("\nDetailed Security Issues")
-        print("=======================\n")
-        for issue in analysis.issues:
-            print(f"Severity: {issue.severity}")
-            print(f"Resource: {issue.resource}")
-            print(f"Issue: {issue.issue}")
-            print("\nExplanation:")
-            print(issue.explanation)
-            print("\nRecommendation:")
-            print(issue.recommendation)
-            print("\n---\n")
+    # Print results, the issues have already been printed when streaming them
+    _print_analysis(analysis, include_issues=not args.stream_issues)
     
-    return 0
+    return return_code
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""Analysis Cache Module
+
+This module persists LLM security analyses on disk, keyed by a content hash of
+the prompt, the provider, the model and the Terraform changes. Re-running the
+analysis on unchanged changes - common while iterating on a Terraform
+configuration - is then served from disk instead of round-tripping to the LLM.
+Expired entries and the oldest entries beyond a fixed count are removed
+whenever an entry is written.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Type, TypeVar
+
+import orjson
+from pydantic import BaseModel, ValidationError
+
+TFSEC_HOME = Path.home() / ".tfsec"
+DEFAULT_CACHE_DIR = TFSEC_HOME / "cache"
+DEFAULT_MAX_ENTRIES = 1024
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Write data to path so that concurrent readers never see a partial file.
+
+    Args:
+        path: File to write, its directory is created if necessary
+        data: Contents of the file
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def prune_cache(cache_dir: Path, max_entries: Optional[int] = None, max_age: Optional[float] = None) -> None:
+    """
+    Remove expired cache entries and the oldest entries beyond max_entries.
+
+    Failing to remove an entry is not an error.
+
+    Args:
+        cache_dir: Directory holding the cache entries as JSON files
+        max_entries: Maximum number of entries to keep, unbounded if None
+        max_age: Maximum age of an entry in seconds, entries never expire if None
+    """
+    entries = []
+    for path in cache_dir.glob("*.json"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    entries.sort(reverse=True)
+
+    now = time.time()
+    for index, (mtime, path) in enumerate(entries):
+        expired = max_age is not None and now - mtime > max_age
+        if expired or (max_entries is not None and index >= max_entries):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def cache_key(prompt_template: str, provider: str, model_name: str, changes: Dict[str, Any]) -> str:
+    """
+    Compute the cache key for analyzing changes with a prompt and model.
+
+    Args:
+        prompt_template: The prompt template used for the analysis
+        provider: The LLM provider serving the model
+        model_name: Name of the model performing the analysis
+        changes: Dictionary of Terraform resource changes
+
+    Returns:
+        Hex digest identifying the analysis
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    # Sorted keys make the key independent of the order resources and attributes were collected in
+    serialized_changes = orjson.dumps(changes, option=orjson.OPT_SORT_KEYS)
+    for part in (prompt_template.encode(), provider.encode(), model_name.encode(), serialized_changes):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Stores serialized pydantic models as JSON files in a cache directory."""
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: Optional[float] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            cache_dir: Directory holding the cache entries, ~/.tfsec/cache by default
+            ttl: Maximum age of an entry in seconds, entries never expire if None
+            max_entries: Maximum number of entries, the least recently written are removed first
+        """
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str, model: Type[ModelT]) -> Optional[ModelT]:
+        """Return the cached entry for key, or None if it is missing, expired or invalid."""
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            return model.model_validate_json(path.read_bytes())
+        except (OSError, ValidationError):
+            return None
+
+    def set(self, key: str, value: BaseModel) -> None:
+        """Store value under key and prune old entries. Failing to write the cache is not an error."""
+        try:
+            write_atomic(self._path(key), value.model_dump_json().encode())
+        except OSError:
+            pass
+        prune_cache(self.cache_dir, max_entries=self.max_entries, max_age=self.ttl)
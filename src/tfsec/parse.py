@@ -6,7 +6,7 @@ generate meaningful diffs, as Terraform uses this state to determine what change
 are needed.
 
 Requirements:
-    - Python 3.7+
+    - Python 3.10+
     - Terraform CLI installed and in PATH
     - An existing Terraform state file for comparison
 
@@ -17,8 +17,8 @@ Example:
     python parse.py ./my-terraform-config --state ./terraform.tfstate
 
 The module works by:
-1. Copying the provided state file to the target directory
-2. Running terraform init to initialize the configuration
+1. Linking the provided state file into the target directory
+2. Running terraform init to initialize the configuration, unless it is current
 3. Executing terraform plan to generate a plan
 4. Converting the plan to JSON format
 5. Analyzing changes between the existing state and planned state
@@ -44,8 +44,11 @@ Output Format:
 Important Notes:
     1. State File Requirement: An existing state file is crucial for generating
        meaningful diffs. Without it, Terraform treats everything as new resources.
-    2. State File Handling: The module temporarily copies the state file to the
-       target directory and removes it after planning.
+    2. State File Handling: The module temporarily places the state file in the
+       target directory as terraform.tfstate and removes it after planning. It
+       is hardlinked if possible, else symlinked, else copied. Removing it only
+       unlinks that link, the original state file is left in place, but as
+       long as it is linked any write to it also changes the original.
     3. Security: Ensure the state file contains no sensitive information, as it
        may be logged in the diff output.
 
@@ -64,118 +67,446 @@ Error Handling:
     Error messages are written to stderr with appropriate exit codes.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from pathlib import Path
+import argparse
+import asyncio
 import subprocess
-import json
+import hashlib
+import importlib.metadata
+import os
 import shutil
-from typing import Optional, Dict, Any
-
-
-@dataclass
+import sys
+import time
+import weakref
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple, Union
+
+import orjson
+
+from tfsec.cache import TFSEC_HOME, prune_cache, write_atomic
+
+try:
+    import ijson
+except ImportError:  # streaming the plan is optional
+    ijson = None
+
+STREAMING_AVAILABLE = ijson is not None
+# Raised by ijson on malformed JSON, it does not derive from ValueError
+_JSONStreamError = ijson.JSONError if STREAMING_AVAILABLE else ValueError
+
+# Providers are downloaded once into this directory and shared by all runs
+PLUGIN_CACHE_DIR = TFSEC_HOME / "tf-plugin-cache"
+# Resource changes extracted from plan files, keyed by a hash of the file
+CHANGES_CACHE_DIR = TFSEC_HOME / "changes-cache"
+# Bump whenever the extracted changes or their cache entries change shape
+CHANGES_CACHE_FORMAT = 1
+CHANGES_CACHE_MAX_ENTRIES = 128
+CHANGES_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+# The plugin cache is not safe for concurrent use, so terraform init runs one
+# at a time. asyncio locks belong to one event loop, hence one lock per loop.
+_INIT_LOCKS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+# Records the lock file that .terraform/ was last initialized for
+INIT_STAMP_FILE = ".tfsec-init"
+
+# Attributes whose changes are purely cosmetic
+NOISE_ATTRIBUTES = frozenset({"tags", "tags_all", "labels", "description"})
+# Helper resource types known to have no security surface. Any other type is
+# kept, random_password and random_string for example hold secrets.
+BENIGN_RESOURCE_TYPES = frozenset({
+    "null_resource", "terraform_data", "random_id", "random_integer", "random_pet",
+    "random_shuffle", "random_uuid", "time_sleep", "time_static", "time_offset",
+})
+
+# Bytes read at a time when discarding unparsed terraform show output
+_DRAIN_CHUNK_SIZE = 64 * 1024
+
+# Only the end of long terraform logs is kept, that is where errors are reported
+MAX_LOG_CHARS = 64 * 1024
+
+
+@dataclass(slots=True, frozen=True)
 class TerraformPlanResult:
     stdout: str
     stderr: str
     json_plan: Optional[Dict[str, Any]]
     return_code: int
     error: Optional[str] = None
-
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert the result to a dictionary for serialization."""
+    # Resource changes collected while streaming the plan, json_plan is None then
+    changes: Optional[Dict[str, Any]] = None
+    stdout_truncated: bool = False
+    stderr_truncated: bool = False
+
+    def __post_init__(self):
+        # The instance is frozen, so the truncated logs bypass __setattr__
+        if len(self.stdout) > MAX_LOG_CHARS:
+            object.__setattr__(self, "stdout", self.stdout[-MAX_LOG_CHARS:])
+            object.__setattr__(self, "stdout_truncated", True)
+        if len(self.stderr) > MAX_LOG_CHARS:
+            object.__setattr__(self, "stderr", self.stderr[-MAX_LOG_CHARS:])
+            object.__setattr__(self, "stderr_truncated", True)
+
+    @property
+    def failed(self) -> bool:
+        """Whether terraform failed, with -detailed-exitcode plan only exits with 1 on errors."""
+        return self.error is not None or self.return_code == 1 or (self.json_plan is None and self.changes is None)
+
+    def to_dict(self, include_logs: bool = True) -> Dict[str, Any]:
+        """Convert the result to a dictionary for serialization, optionally without stdout and stderr."""
         return {
-            "stdout": self.stdout,
-            "stderr": self.stderr,
+            "stdout": self.stdout if include_logs else "",
+            "stderr": self.stderr if include_logs else "",
+            "stdout_truncated": self.stdout_truncated and include_logs,
+            "stderr_truncated": self.stderr_truncated and include_logs,
             "json_plan": self.json_plan,
             "return_code": self.return_code,
-            "error": self.error
+            "error": self.error,
+            "changes": self.changes
         }
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'TerraformPlanResult':
         """Create a TerraformPlanResult from a dictionary."""
         return cls(
-            stdout=data["stdout"],
-            stderr=data["stderr"],
+            stdout=data.get("stdout", ""),
+            stderr=data.get("stderr", ""),
             json_plan=data["json_plan"],
             return_code=data["return_code"],
-            error=data.get("error")
+            error=data.get("error"),
+            changes=data.get("changes"),
+            stdout_truncated=data.get("stdout_truncated", False),
+            stderr_truncated=data.get("stderr_truncated", False)
         )
 
-def save_plan_result(result: TerraformPlanResult, output_file: Path) -> None:
-    """Save TerraformPlanResult to a JSON file."""
-    with open(output_file, 'w') as f:
-        json.dump(result.to_dict(), f, indent=2)
+def save_plan_result(result: TerraformPlanResult, output_file: Path, include_logs: bool = True) -> None:
+    """Save TerraformPlanResult to a JSON file, terraform's stdout and stderr only if include_logs is set."""
+    Path(output_file).write_bytes(orjson.dumps(result.to_dict(include_logs=include_logs), option=orjson.OPT_INDENT_2))
+
+def load_plan_result(input_file: Path, use_cache: bool = False) -> TerraformPlanResult:
+    """
+    Load TerraformPlanResult from a JSON file.
+
+    With use_cache, the resource changes extracted from a successful plan are
+    stored under ~/.tfsec/changes-cache keyed by a hash of the file contents,
+    the package version and the cache format. Loading the same plan file again
+    then returns a result with only the changes set, without parsing the plan
+    or extracting its changes again. Entries expire after a week and only the
+    most recent ones are kept.
+
+    Args:
+        input_file: Path to a file written by save_plan_result
+        use_cache: Whether to look up and store the extracted changes
+
+    Returns:
+        The loaded TerraformPlanResult
+    """
+    plan_bytes = Path(input_file).read_bytes()
+    if not use_cache:
+        return TerraformPlanResult.from_dict(orjson.loads(plan_bytes))
+
+    digest = hashlib.blake2b(f"{CHANGES_CACHE_FORMAT}\0{_package_version()}\0".encode(), digest_size=32)
+    digest.update(plan_bytes)
+    cache_file = CHANGES_CACHE_DIR / f"{digest.hexdigest()}.json"
+    try:
+        if time.time() - cache_file.stat().st_mtime <= CHANGES_CACHE_MAX_AGE:
+            cached = orjson.loads(cache_file.read_bytes())
+            return TerraformPlanResult(stdout="", stderr="", json_plan=None, return_code=cached["return_code"],
+                                       changes=cached["changes"])
+    except (OSError, KeyError, TypeError, orjson.JSONDecodeError):
+        pass
+
+    result = TerraformPlanResult.from_dict(orjson.loads(plan_bytes))
+    if result.error is None and result.changes is None and result.json_plan:
+        result = replace(result, changes=create_resource_changes_dict(result.json_plan))
+        try:
+            write_atomic(cache_file, orjson.dumps({"return_code": result.return_code, "changes": result.changes}))
+        except OSError:
+            pass
+        prune_cache(CHANGES_CACHE_DIR, max_entries=CHANGES_CACHE_MAX_ENTRIES, max_age=CHANGES_CACHE_MAX_AGE)
+    return result
+
+def _package_version() -> str:
+    """Version of the installed package, cached results of other versions are not reused."""
+    try:
+        return importlib.metadata.version("terraform-secure")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+async def run_terraform_plan_async(directory: Path, state_file: Optional[Path] = None,
+                                   output_file: Optional[Path] = None,
+                                   stream_changes: bool = False,
+                                   parallelism: Optional[int] = None,
+                                   force_init: bool = False,
+                                   safe_no_lock: bool = True,
+                                   capture_init_output: bool = False) -> TerraformPlanResult:
+    """
+    Run terraform plan in the specified directory and capture the output in JSON format.
+
+    terraform runs in asyncio subprocesses, so plans of several directories can
+    run concurrently from one event loop.
+
+    With stream_changes, only the resource changes are extracted from the plan
+    JSON while it is being read and stored in the result's changes instead of
+    json_plan. This keeps the rest of the plan (configuration, prior state)
+    out of memory but requires the optional ijson package.
 
-def load_plan_result(input_file: Path) -> TerraformPlanResult:
-    """Load TerraformPlanResult from a JSON file."""
-    with open(input_file) as f:
-        data = json.load(f)
-    return TerraformPlanResult.from_dict(data)
+    parallelism limits the concurrent operations of terraform plan. Refreshing
+    resources is mostly waiting on provider APIs, so it defaults to three times
+    the number of CPUs instead of terraform's default of 10.
 
-def run_terraform_plan(directory: Path, state_file: Optional[Path] = None, output_file: Optional[Path] = None) -> TerraformPlanResult:
-    """Run terraform plan in the specified directory and capture the output in JSON format."""
-    result = _run_terraform_plan(directory, state_file)
+    terraform init is skipped if the directory was already initialized for
+    its current lock file and configuration, unless force_init is set.
+
+    The plan only reads the state, so with safe_no_lock it does not acquire
+    the state lock, saving a round trip to remote backends.
+
+    The verbose stdout of terraform init is discarded unless
+    capture_init_output is set, its stderr is always kept to report failures.
+    """
+    if stream_changes and not STREAMING_AVAILABLE:
+        raise ImportError("Streaming the plan requires the ijson package")
+    result = await _run_terraform_plan(
+        directory, state_file, stream_changes, parallelism, force_init, safe_no_lock, capture_init_output
+    )
     if output_file and result:
-        save_plan_result(result, output_file)
+        # The logs are only worth keeping to diagnose a failed plan
+        save_plan_result(result, output_file, include_logs=result.failed)
     return result
 
-def _run_terraform_plan(directory: Path, state_file: Optional[Path] = None) -> TerraformPlanResult:
+def run_terraform_plan(directory: Path, state_file: Optional[Path] = None, output_file: Optional[Path] = None,
+                       stream_changes: bool = False, parallelism: Optional[int] = None,
+                       force_init: bool = False, safe_no_lock: bool = True,
+                       capture_init_output: bool = False) -> TerraformPlanResult:
+    """Synchronous wrapper around run_terraform_plan_async."""
+    return asyncio.run(run_terraform_plan_async(
+        directory, state_file, output_file, stream_changes, parallelism, force_init, safe_no_lock,
+        capture_init_output
+    ))
+
+async def run_terraform_plans(directories: Iterable[Path],
+                              stream_changes: bool = False,
+                              parallelism: Optional[int] = None,
+                              force_init: bool = False,
+                              safe_no_lock: bool = True) -> List[TerraformPlanResult]:
+    """
+    Run terraform plan in several directories concurrently.
+
+    Args:
+        directories: Directories containing Terraform configurations
+        stream_changes: Whether to only extract the resource changes, see run_terraform_plan_async
+        parallelism: Concurrent operations of each terraform plan, see run_terraform_plan_async
+        force_init: Whether to run terraform init even in initialized directories
+        safe_no_lock: Whether to plan without acquiring the state lock
+
+    Returns:
+        The plan results in the order of directories
+    """
+    return await asyncio.gather(
+        *(run_terraform_plan_async(directory, stream_changes=stream_changes, parallelism=parallelism,
+                                   force_init=force_init, safe_no_lock=safe_no_lock)
+          for directory in directories)
+    )
+
+def _decode(output: Union[str, bytes, None]) -> str:
+    """Decode captured process output, only as much of its end as TerraformPlanResult keeps."""
+    if isinstance(output, bytes):
+        # Up to 4 bytes per character, plus up to 3 bytes of a character cut in half
+        # that decode to replacement characters which the result truncates away
+        return output[-(4 * MAX_LOG_CHARS + 3):].decode("utf-8", errors="replace")
+    return output or ""
+
+def _terraform_env() -> Dict[str, str]:
+    """Build the environment for terraform with a persistent provider plugin cache."""
+    env = os.environ.copy()
+    # Skip the version check against HashiCorp Checkpoint and the hints meant for interactive use
+    env["TF_IN_AUTOMATION"] = "1"
+    env["CHECKPOINT_DISABLE"] = "1"
+    env["TF_INPUT"] = "0"
+    if "TF_PLUGIN_CACHE_DIR" in env:
+        # Keep a plugin cache the user configured
+        return env
+    try:
+        PLUGIN_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return env
+    env["TF_PLUGIN_CACHE_DIR"] = str(PLUGIN_CACHE_DIR)
+    env["TF_PLUGIN_CACHE_MAY_BREAK_DEPENDENCY_LOCK_FILE"] = "true"
+    return env
+
+def _init_lock() -> asyncio.Lock:
+    """Return the lock serializing terraform init within the running event loop."""
+    loop = asyncio.get_running_loop()
+    lock = _INIT_LOCKS.get(loop)
+    if lock is None:
+        lock = _INIT_LOCKS[loop] = asyncio.Lock()
+    return lock
+
+def _lock_file_digest(directory: Path) -> Optional[str]:
+    """Hash the dependency lock file, None if there is none."""
+    try:
+        data = (directory / ".terraform.lock.hcl").read_bytes()
+    except OSError:
+        return None
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _config_files(directory: Path) -> Iterator[Path]:
+    """Yield the configuration files of directory and of the local modules it calls."""
+    config_dirs = [directory]
+    try:
+        manifest = orjson.loads((directory / ".terraform" / "modules" / "modules.json").read_bytes())
+        for module in manifest.get("Modules", []):
+            module_dir = module.get("Dir")
+            # Downloaded modules live in .terraform/ and only change with init
+            if module_dir and Path(module_dir).parts[:1] != (".terraform",):
+                config_dirs.append(directory / module_dir)
+    except (OSError, orjson.JSONDecodeError, AttributeError, TypeError):
+        pass
+    for config_dir in config_dirs:
+        yield from config_dir.glob("*.tf")
+        yield from config_dir.glob("*.tf.json")
+
+def _init_is_current(directory: Path) -> bool:
+    """
+    Check whether .terraform/ was initialized by us for the current lock file.
+
+    Configuration files changed after the last init may require new providers
+    or modules, so they also make the initialization stale. This covers
+    *.tf and *.tf.json files of the directory and of the local modules listed
+    in the module manifest. init leaves an unchanged lock file alone, so they
+    are compared to our stamp instead.
+    """
+    digest = _lock_file_digest(directory)
+    if digest is None or not (directory / ".terraform" / "providers").is_dir():
+        return False
+    stamp = directory / ".terraform" / INIT_STAMP_FILE
+    try:
+        if stamp.read_text() != digest:
+            return False
+        init_mtime = stamp.stat().st_mtime
+        return all(config.stat().st_mtime <= init_mtime for config in _config_files(directory))
+    except OSError:
+        return False
+
+def _record_init(directory: Path) -> None:
+    """Remember the lock file that terraform init just ran for."""
+    digest = _lock_file_digest(directory)
+    if digest is None:
+        return
+    try:
+        (directory / ".terraform" / INIT_STAMP_FILE).write_text(digest)
+    except OSError:
+        pass
+
+def _link_state_file(state_file: Path, target: Path) -> None:
+    """Place the state file at target, linking instead of copying where possible."""
+    # terraform only reads the state, so a link avoids copying all of it
+    try:
+        os.link(state_file, target)
+    except OSError:
+        try:
+            os.symlink(state_file.resolve(), target)
+        except OSError:
+            shutil.copy2(state_file, target)
+
+async def _run_terraform_plan(directory: Path, state_file: Optional[Path] = None,
+                              stream_changes: bool = False,
+                              parallelism: Optional[int] = None,
+                              force_init: bool = False,
+                              safe_no_lock: bool = True,
+                              capture_init_output: bool = False) -> TerraformPlanResult:
+    if parallelism is None:
+        parallelism = 3 * (os.cpu_count() or 1)
     copied_state = None
+    env = _terraform_env()
     try:
-        # Copy state file if provided
+        # Make the state file available in the directory if provided. This happens
+        # before init, which may inspect a local state when configuring the backend.
         if state_file and state_file.exists():
             copied_state = directory / "terraform.tfstate"
-            shutil.copy2(state_file, copied_state)
-
-        # Initialize terraform
-        init_process = subprocess.run(
-            ["terraform", "init"],
-            cwd=directory,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-
-        # Run terraform plan with JSON output
-        plan_process = subprocess.run(
-            ["terraform", "plan", "-out=tfplan", "-detailed-exitcode"],
+            _link_state_file(state_file, copied_state)
+
+        # Initialize terraform unless it is already initialized for the current lock file.
+        # Its output is only decoded if init fails.
+        if force_init or not _init_is_current(directory):
+            init_command = ["terraform", "init", "-input=false", "-no-color"]
+            async with _init_lock():
+                init_process = await asyncio.create_subprocess_exec(
+                    *init_command,
+                    cwd=directory,
+                    env=env,
+                    stdout=asyncio.subprocess.PIPE if capture_init_output else asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                init_stdout, init_stderr = await init_process.communicate()
+            if init_process.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    init_process.returncode, init_command, output=init_stdout, stderr=init_stderr
+                )
+            _record_init(directory)
+
+        # Run terraform plan non-interactively, without colors and with warnings summarized
+        plan_command = [
+            "terraform", "plan", "-out=tfplan", "-detailed-exitcode", f"-parallelism={parallelism}",
+            "-input=false", "-no-color", "-compact-warnings"
+        ]
+        if safe_no_lock:
+            plan_command.append("-lock=false")
+        plan_process = await asyncio.create_subprocess_exec(
+            *plan_command,
             cwd=directory,
-            capture_output=True,
-            text=True
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
+        plan_stdout, plan_stderr = await plan_process.communicate()
+        plan_stdout, plan_stderr = _decode(plan_stdout), _decode(plan_stderr)
 
-        # Convert plan to JSON
-        show_process = subprocess.run(
-            ["terraform", "show", "-json", "tfplan"],
+        # Convert plan to JSON, parsing the raw bytes from the pipe
+        # instead of buffering and decoding all of it to a str first
+        show_process = await asyncio.create_subprocess_exec(
+            "terraform", "show", "-json", "-no-color", "tfplan",
             cwd=directory,
-            capture_output=True,
-            text=True
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
         )
-
-        json_plan = None
-        if show_process.returncode == 0:
-            try:
-                json_plan = json.loads(show_process.stdout)
-            except json.JSONDecodeError as e:
-                return TerraformPlanResult(
-                    stdout=plan_process.stdout,
-                    stderr=plan_process.stderr,
-                    json_plan=None,
-                    return_code=1,
-                    error=f"Failed to parse JSON: {str(e)}"
-                )
+        parse_error = None
+        json_plan = changes = None
+        try:
+            if stream_changes:
+                changes = await _stream_resource_changes(show_process.stdout)
+            else:
+                json_plan = orjson.loads(await show_process.stdout.read())
+        except (orjson.JSONDecodeError, _JSONStreamError) as e:
+            parse_error = e
+        finally:
+            # Drain what was not parsed so that terraform show can exit
+            while await show_process.stdout.read(_DRAIN_CHUNK_SIZE):
+                pass
+            show_returncode = await show_process.wait()
+
+        if show_returncode != 0:
+            json_plan = changes = None
+        elif parse_error is not None:
+            return TerraformPlanResult(
+                stdout=plan_stdout,
+                stderr=plan_stderr,
+                json_plan=None,
+                return_code=1,
+                error=f"Failed to parse JSON: {str(parse_error)}"
+            )
 
         return TerraformPlanResult(
-            stdout=plan_process.stdout,
-            stderr=plan_process.stderr,
+            stdout=plan_stdout,
+            stderr=plan_stderr,
             json_plan=json_plan,
-            return_code=plan_process.returncode
+            return_code=plan_process.returncode,
+            changes=changes
         )
 
     except subprocess.CalledProcessError as e:
         return TerraformPlanResult(
-            stdout=e.stdout if hasattr(e, 'stdout') else "",
-            stderr=e.stderr if hasattr(e, 'stderr') else "",
+            stdout=_decode(e.stdout),
+            stderr=_decode(e.stderr),
             json_plan=None,
             return_code=e.returncode,
             error=str(e)
@@ -186,7 +517,7 @@ def _run_terraform_plan(directory: Path, state_file: Optional[Path] = None) -> T
             copied_state.unlink()
 
 
-def extract_changes(resource_change):
+def extract_changes(resource_change: Optional[Dict[str, Any]]) -> Optional[Dict[str, Dict[str, Any]]]:
     """Extract differences between before and after states."""
     if not resource_change:
         return None
@@ -199,19 +530,24 @@ def extract_changes(resource_change):
     if "no-op" in actions:
         return None
         
-    # Compare before and after directly
-    changes = {}
+    # Compare before and after in one pass over each side, a missing key
+    # counts as None
+    changes: Dict[str, Dict[str, Any]] = {}
     if before is not None and after is not None:
-        all_keys = set(before.keys()) | set(after.keys())
-        for key in all_keys:
-            before_value = before.get(key)
+        for key, before_value in before.items():
             after_value = after.get(key)
             if before_value != after_value:
                 changes[key] = {
                     "before": before_value,
                     "after": after_value
                 }
-                
+        for key, after_value in after.items():
+            if after_value is not None and key not in before:
+                changes[key] = {
+                    "before": None,
+                    "after": after_value
+                }
+
     return changes if changes else None
 
 def create_resource_changes_dict(json_plan: Dict[str, Any]) -> Dict[str, Any]:
@@ -224,27 +560,94 @@ def create_resource_changes_dict(json_plan: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Dictionary containing resource changes
     """
-    changes = {}
-    for resource in json_plan.get("resource_changes", []):
-        resource_changes = extract_changes(resource.get("change", {}))
-        if resource_changes:
-            changes[resource["address"]] = {
-                "type": resource.get("type", ""),
-                "name": resource.get("name", ""),
-                "action": resource["change"].get("actions", []),
-                "changes": resource_changes
-            }
+    return _collect_resource_changes(json_plan.get("resource_changes", []))
+
+async def _stream_resource_changes(stream: asyncio.StreamReader) -> Dict[str, Any]:
+    """Create the dictionary of resource changes while reading plan JSON from a stream."""
+    changes: Dict[str, Any] = {}
+    async for resource in ijson.items(stream, "resource_changes.item", use_float=True):
+        _add_resource_change(changes, resource)
+    return changes
+
+def _collect_resource_changes(resources: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {}
+    for resource in resources:
+        _add_resource_change(changes, resource)
     return changes
 
-def main():
-    import sys
-    import json
-    import argparse
+def _add_resource_change(changes: Dict[str, Any], resource: Dict[str, Any]) -> None:
+    change = resource.get("change") or {}
+    resource_changes = extract_changes(change)
+    if resource_changes:
+        changes[resource["address"]] = {
+            "type": resource.get("type", ""),
+            "name": resource.get("name", ""),
+            "action": change.get("actions", []),
+            "changes": resource_changes
+        }
 
+def filter_security_relevant(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce resource changes to those with potential security impact.
+
+    Changes to cosmetic attributes are dropped, as are helper resources known to
+    have no security surface. Every other resource with remaining changed
+    attributes is kept, so unknown resource types are never dropped.
+
+    Args:
+        changes: Dictionary of resource changes as created by create_resource_changes_dict
+
+    Returns:
+        Dictionary containing the security relevant resource changes
+    """
+    relevant = {}
+    for address, resource in changes.items():
+        if resource["type"] in BENIGN_RESOURCE_TYPES:
+            continue
+        attributes = {
+            key: value for key, value in resource["changes"].items()
+            if key not in NOISE_ATTRIBUTES
+        }
+        if attributes:
+            relevant[address] = dict(resource, changes=attributes)
+    return relevant
+
+def deduplicate_changes(changes: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+    """
+    Group resources whose changes are identical, e.g. many instances of a module.
+
+    Args:
+        changes: Dictionary of resource changes as created by create_resource_changes_dict
+
+    Returns:
+        Tuple of the resource changes with one representative per group and a
+        dictionary mapping each representative's address to the addresses of
+        all resources in its group
+    """
+    representatives = {}
+    groups: Dict[bytes, List[str]] = {}
+    for address, resource in changes.items():
+        key = hashlib.blake2b(orjson.dumps(
+            {"type": resource["type"], "action": resource["action"], "changes": resource["changes"]},
+            option=orjson.OPT_SORT_KEYS
+        )).digest()
+        addresses = groups.setdefault(key, [])
+        if not addresses:
+            representatives[address] = resource
+        addresses.append(address)
+    return representatives, {addresses[0]: addresses for addresses in groups.values()}
+
+def main() -> None:
     parser = argparse.ArgumentParser(description='Parse Terraform plan output')
     parser.add_argument('directory', type=Path, help='Directory containing Terraform configuration')
     parser.add_argument('--state', type=Path, help='Path to Terraform state file to use')
     parser.add_argument('--output', type=Path, help='Save plan result to JSON file')
+    parser.add_argument('--stream', action='store_true',
+                        help='Only extract resource changes while reading the plan (requires ijson)')
+    parser.add_argument('--parallelism', type=int,
+                        help='Concurrent operations of terraform plan (default: 3 times the number of CPUs)')
+    parser.add_argument('--force-init', action='store_true',
+                        help='Run terraform init even if the directory is already initialized')
     
     args = parser.parse_args()
 
@@ -256,17 +659,27 @@ def main():
         print(f"Error: State file {args.state} does not exist")
         sys.exit(1)
 
-    result = run_terraform_plan(args.directory, args.state, args.output)
+    if args.stream and not STREAMING_AVAILABLE:
+        print("Error: --stream requires the ijson package")
+        sys.exit(1)
+
+    result = run_terraform_plan(args.directory, args.state, args.output, stream_changes=args.stream,
+                                parallelism=args.parallelism, force_init=args.force_init)
     
     if result.error:
         print(f"Error: {result.error}", file=sys.stderr)
         print(f"Stderr: {result.stderr}", file=sys.stderr)
         sys.exit(1)
 
-    if result.json_plan:
-        changes = create_resource_changes_dict(result.json_plan)
+    if result.changes is not None or result.json_plan:
+        if result.changes is not None:
+            changes = result.changes
+        else:
+            changes = create_resource_changes_dict(result.json_plan)
         if changes:
-            print(json.dumps({"changes": changes}, indent=2))
+            # Write the serialized bytes directly instead of encoding a str again
+            sys.stdout.flush()
+            sys.stdout.buffer.write(orjson.dumps({"changes": changes}, option=orjson.OPT_INDENT_2) + b"\n")
         else:
             print("No changes detected")
     else:
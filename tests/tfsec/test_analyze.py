@@ -1,13 +1,36 @@
+import asyncio
+import os
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
-from tfsec.analyze import SecurityAnalysis, SecurityIssue, analyze_changes
-from tfsec.llm_interface import LLMInterface
+from pydantic import BaseModel
+
+from tfsec.analyze import (
+    SECURITY_ANALYSIS_PROMPT,
+    SecurityAnalysis,
+    SecurityIssue,
+    SecuritySummary,
+    analyze_changes,
+    analyze_changes_async,
+    expand_duplicates,
+    analyze_changes_batched,
+    shard_changes,
+)
+from tfsec.cache import AnalysisCache, cache_key
+from tfsec.parse import TerraformPlanResult
 
 
 class TestAnalyze(unittest.TestCase):
     def setUp(self):
+        # Keep the persistent analysis cache out of the home directory
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        cache_dir_patcher = patch('tfsec.cache.DEFAULT_CACHE_DIR', Path(self.cache_dir.name))
+        cache_dir_patcher.start()
+        self.addCleanup(cache_dir_patcher.stop)
+
         self.sample_changes = {
             "changes": {
                 "google_compute_firewall.allow-http-https": {
@@ -37,7 +60,7 @@ class TestAnalyze(unittest.TestCase):
             summary="Found 1 HIGH severity security issue related to firewall rules."
         )
 
-    @patch('tfsec.llm_interface.LLMInterface')
+    @patch('tfsec.analyze.LLMInterface')
     def test_analyze_changes(self, mock_llm_class):
         # Configure mock LLM
         mock_llm = MagicMock()
@@ -58,6 +81,211 @@ class TestAnalyze(unittest.TestCase):
         self.assertEqual(analysis.issues[0].severity, "HIGH")
         self.assertEqual(analysis.issues[0].resource, "google_compute_firewall.allow-http-https")
 
+    def test_schema_generated_once(self):
+        expected = BaseModel.model_json_schema.__func__(SecurityAnalysis)
+        SecurityAnalysis.model_json_schema()["properties"].clear()
+
+        with patch.object(BaseModel, 'model_json_schema') as mock_schema:
+            schema = SecurityAnalysis.model_json_schema()
+
+        # Served from the memoized copy, unaffected by the caller's changes
+        mock_schema.assert_not_called()
+        self.assertEqual(schema, expected)
+
+    def test_expand_duplicates(self):
+        addresses = ["google_compute_firewall.allow-http-https", "google_compute_firewall.copy"]
+
+        analysis = expand_duplicates(
+            self.sample_analysis, {"google_compute_firewall.allow-http-https": addresses}
+        )
+
+        self.assertEqual(analysis.issues[0].affected_resources, addresses)
+        # Not part of the schema the LLM has to fill in
+        self.assertNotIn("affected_resources", SecurityIssue.model_json_schema()["properties"])
+
+    def test_expand_duplicates_non_exact_address(self):
+        addresses = ['module.web.aws_s3_bucket.logs["a"]', 'module.web.aws_s3_bucket.logs["b"]']
+        issue = self.sample_analysis.issues[0].model_copy(update={"resource": "`aws_s3_bucket.logs['a']`"})
+
+        analysis = expand_duplicates(
+            SecurityAnalysis(issues=[issue], summary=""), {'module.web.aws_s3_bucket.logs["a"]': addresses}
+        )
+
+        self.assertEqual(analysis.issues[0].affected_resources, addresses)
+
+    def test_prompt_changes_are_suffix(self):
+        # Everything before the changes must be identical across calls
+        prefix, _, suffix = SECURITY_ANALYSIS_PROMPT.partition("{changes}")
+        self.assertEqual(suffix, "")
+        self.assertNotIn("{", prefix)
+
+    def test_analyze_changes_cached(self):
+        mock_llm = MagicMock(model_name="gpt-4")
+        mock_llm.generate_pydantic.return_value = self.sample_analysis
+        cache = AnalysisCache()
+
+        first = analyze_changes(mock_llm, self.sample_changes, cache=cache)
+        second = analyze_changes(mock_llm, self.sample_changes, cache=cache)
+
+        # The second analysis is served from disk
+        mock_llm.generate_pydantic.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(len(list(Path(self.cache_dir.name).glob("*.json"))), 1)
+
+    def test_cache_key_canonical(self):
+        plan = {"changes": {
+            "b": {"type": "t", "action": ["create"], "changes": {"x": {"before": None, "after": 1}}},
+            "a": {"type": "t", "action": ["delete"], "changes": {}},
+        }}
+        reordered = {"changes": {
+            "a": {"changes": {}, "action": ["delete"], "type": "t"},
+            "b": {"type": "t", "changes": {"x": {"after": 1, "before": None}}, "action": ["create"]},
+        }}
+
+        self.assertEqual(
+            cache_key(SECURITY_ANALYSIS_PROMPT, "OpenAIWrapper", "gpt-4", plan),
+            cache_key(SECURITY_ANALYSIS_PROMPT, "OpenAIWrapper", "gpt-4", reordered),
+        )
+        self.assertNotEqual(
+            cache_key(SECURITY_ANALYSIS_PROMPT, "OpenAIWrapper", "gpt-4", plan),
+            cache_key(SECURITY_ANALYSIS_PROMPT, "OpenAIWrapper", "phi4", plan),
+        )
+
+    def test_analyze_changes_cache_per_provider(self):
+        class OpenAIWrapper:
+            pass
+
+        class OllamaWrapper:
+            pass
+
+        cache = AnalysisCache()
+        for client in (OpenAIWrapper(), OllamaWrapper()):
+            mock_llm = MagicMock(model_name="gpt-4", client=client)
+            mock_llm.generate_pydantic.return_value = self.sample_analysis
+            analyze_changes(mock_llm, self.sample_changes, cache=cache)
+            # The same model name served by another provider is not a hit
+            mock_llm.generate_pydantic.assert_called_once()
+
+    def test_analysis_cache_pruned(self):
+        cache = AnalysisCache(ttl=60, max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, self.sample_analysis)
+        os.utime(Path(self.cache_dir.name) / "c.json", (0, 0))
+        cache.set("d", self.sample_analysis)
+
+        # The expired entry and the oldest beyond max_entries are gone
+        self.assertEqual(sorted(p.stem for p in Path(self.cache_dir.name).glob("*.json")), ["b", "d"])
+
+    def test_analyze_changes_cache_expired(self):
+        mock_llm = MagicMock(model_name="gpt-4")
+        mock_llm.generate_pydantic.return_value = self.sample_analysis
+        cache = AnalysisCache(ttl=60)
+
+        analyze_changes(mock_llm, self.sample_changes, cache=cache)
+        for entry in Path(self.cache_dir.name).glob("*.json"):
+            os.utime(entry, (0, 0))
+        analyze_changes(mock_llm, self.sample_changes, cache=cache)
+
+        self.assertEqual(mock_llm.generate_pydantic.call_count, 2)
+
+    def test_shard_changes(self):
+        changes = {"changes": {f"null_resource.r{i}": {} for i in range(5)}}
+
+        shards = list(shard_changes(changes, 2))
+
+        self.assertEqual([len(shard["changes"]) for shard in shards], [2, 2, 1])
+        self.assertEqual(list(shards[2]["changes"]), ["null_resource.r4"])
+
+    def test_analyze_changes_batched(self):
+        changes = {"changes": {
+            "google_compute_firewall.a": self.sample_changes["changes"]["google_compute_firewall.allow-http-https"],
+            "google_compute_firewall.b": self.sample_changes["changes"]["google_compute_firewall.allow-http-https"],
+        }}
+        mock_llm = MagicMock()
+        mock_llm.generate_pydantic.side_effect = [
+            self.sample_analysis,
+            self.sample_analysis,
+            SecuritySummary(summary="Found 2 HIGH severity issues."),
+        ]
+
+        analysis = analyze_changes_batched(mock_llm, changes, batch_size=1)
+
+        # One call per shard plus one call for the summary
+        self.assertEqual(mock_llm.generate_pydantic.call_count, 3)
+        self.assertEqual(len(analysis.issues), 2)
+        self.assertEqual(analysis.summary, "Found 2 HIGH severity issues.")
+
+    def test_analyze_changes_async(self):
+        changes = {"changes": {
+            f"google_compute_firewall.r{i}": self.sample_changes["changes"]["google_compute_firewall.allow-http-https"]
+            for i in range(3)
+        }}
+        mock_llm = MagicMock()
+        mock_llm.generate_pydantic.side_effect = lambda output_schema, **kwargs: (
+            SecuritySummary(summary="Found 3 HIGH severity issues.")
+            if output_schema is SecuritySummary else self.sample_analysis
+        )
+
+        analysis = asyncio.run(analyze_changes_async(mock_llm, changes, batch_size=1, concurrency=2))
+
+        self.assertEqual(mock_llm.generate_pydantic.call_count, 4)
+        self.assertEqual(len(analysis.issues), 3)
+        self.assertEqual(analysis.summary, "Found 3 HIGH severity issues.")
+
+    def test_analyze_changes_batched_reports_each_batch(self):
+        mock_llm = MagicMock()
+        mock_llm.generate_pydantic.side_effect = [
+            self.sample_analysis,
+            SecurityAnalysis(issues=[], summary="No issues."),
+            SecuritySummary(summary="Found 1 HIGH severity issue."),
+        ]
+        changes = {"changes": {"a": {}, "b": {}}}
+        reported = []
+
+        analyze_changes_batched(mock_llm, changes, batch_size=1, on_analysis=reported.append)
+
+        self.assertEqual(reported, [self.sample_analysis, SecurityAnalysis(issues=[], summary="No issues.")])
+
+    def test_analyze_changes_batched_failure(self):
+        mock_llm = MagicMock()
+        mock_llm.generate_pydantic.return_value = None
+
+        analysis = analyze_changes_batched(mock_llm, self.sample_changes, batch_size=1)
+
+        self.assertIsNone(analysis)
+
+    def test_analyze_changes_batched_summary_failure(self):
+        changes = {"changes": {
+            "google_compute_firewall.a": self.sample_changes["changes"]["google_compute_firewall.allow-http-https"],
+            "google_compute_firewall.b": self.sample_changes["changes"]["google_compute_firewall.allow-http-https"],
+        }}
+        mock_llm = MagicMock()
+        mock_llm.generate_pydantic.side_effect = [self.sample_analysis, self.sample_analysis, None]
+
+        analysis = analyze_changes_batched(mock_llm, changes, batch_size=1)
+
+        # The issues are kept with a summary that only counts them
+        self.assertEqual(len(analysis.issues), 2)
+        self.assertEqual(analysis.summary, "Found 2 security issues:\n- HIGH: 2")
+
+    def test_analyze_changes_batched_partial_failure(self):
+        changes = {"changes": {
+            "google_compute_firewall.a": self.sample_changes["changes"]["google_compute_firewall.allow-http-https"],
+            "google_compute_firewall.b": self.sample_changes["changes"]["google_compute_firewall.allow-http-https"],
+        }}
+        mock_llm = MagicMock()
+        mock_llm.generate_pydantic.side_effect = [
+            self.sample_analysis,
+            None,
+            SecuritySummary(summary="Found 1 HIGH severity issue."),
+        ]
+
+        analysis = analyze_changes_batched(mock_llm, changes, batch_size=1)
+
+        # The failed group does not discard the issues of the other one
+        self.assertEqual(analysis.issues, self.sample_analysis.issues)
+        self.assertEqual(analysis.unanalyzed_resources, ["google_compute_firewall.b"])
+
     @patch('tfsec.analyze.llm_from_config')
     @patch('tfsec.analyze.run_terraform_plan')
     def test_main_function(self, mock_run_plan, mock_llm_from_config):
@@ -68,6 +296,7 @@ class TestAnalyze(unittest.TestCase):
 
         mock_run_plan.return_value = MagicMock(
             error=None,
+            changes=None,
             json_plan={
                 "resource_changes": [{
                     "address": "google_compute_firewall.allow-http-https",
@@ -103,6 +332,7 @@ class TestAnalyze(unittest.TestCase):
         # Configure mock to return no changes
         mock_run_plan.return_value = MagicMock(
             error=None,
+            changes=None,
             json_plan={"resource_changes": []}
         )
 
@@ -121,6 +351,7 @@ class TestAnalyze(unittest.TestCase):
         # Configure mock to return an error
         mock_run_plan.return_value = MagicMock(
             error="Terraform initialization failed",
+            changes=None,
             json_plan=None
         )
 
@@ -133,6 +364,49 @@ class TestAnalyze(unittest.TestCase):
             self.assertEqual(return_code, 1)
             mock_llm_from_config.assert_called_once()
 
+    @patch('tfsec.analyze.llm_from_config')
+    @patch('tfsec.analyze.run_terraform_plan')
+    def test_main_function_failed_plan(self, mock_run_plan, mock_llm_from_config):
+        # A failed plan has no error of its own and no plan JSON
+        mock_run_plan.return_value = TerraformPlanResult(
+            stdout="", stderr="Error: boom", json_plan=None, return_code=1
+        )
+
+        with patch('sys.argv', ['analyze.py', '--directory', '/fake/dir']), \
+                patch('builtins.print') as mock_print:
+            from tfsec.analyze import main
+            return_code = main()
+
+        # Reported as an error rather than as a plan without changes
+        self.assertEqual(return_code, 1)
+        self.assertIn("Error: boom", mock_print.call_args.args[0])
+        mock_llm_from_config.return_value.generate_pydantic.assert_not_called()
+
+    @patch('tfsec.analyze.llm_from_config')
+    @patch('tfsec.analyze.run_terraform_plan_async')
+    def test_main_function_multiple_directories(self, mock_run_plan, mock_llm_from_config):
+        mock_llm = MagicMock(model_name="gpt-4")
+        mock_llm.generate_pydantic.return_value = self.sample_analysis
+        mock_llm_from_config.return_value = mock_llm
+
+        def run_plan(directory, stream_changes=False, parallelism=None, force_init=False):
+            if directory == Path('/fake/broken'):
+                return MagicMock(error="Terraform initialization failed", changes=None, json_plan=None)
+            return MagicMock(error=None, changes=self.sample_changes["changes"], json_plan=None)
+        mock_run_plan.side_effect = run_plan
+
+        with patch('sys.argv', ['analyze.py', '--directories', '/fake/a', '/fake/broken']):
+            from tfsec.analyze import main
+            return_code = main()
+
+        self.assertEqual(
+            sorted(call.args[0] for call in mock_run_plan.call_args_list),
+            [Path('/fake/a'), Path('/fake/broken')]
+        )
+        mock_llm.generate_pydantic.assert_called_once()
+        # The failing directory determines the exit code
+        self.assertEqual(return_code, 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,18 +1,65 @@
+import asyncio
+import io
 import json
-import subprocess
+import os
+import tempfile
+import time
 import unittest
+from dataclasses import FrozenInstanceError
 from pathlib import Path
-from unittest.mock import MagicMock, mock_open, patch
+from unittest.mock import AsyncMock, MagicMock, mock_open, patch
 
+from tfsec.cache import prune_cache
 from tfsec.parse import (
+    INIT_STAMP_FILE,
+    MAX_LOG_CHARS,
+    STREAMING_AVAILABLE,
     create_resource_changes_dict,
+    deduplicate_changes,
     extract_changes,
+    filter_security_relevant,
+    load_plan_result,
     run_terraform_plan,
+    run_terraform_plans,
+    save_plan_result,
+    TerraformPlanResult,
+    _decode,
+    _link_state_file,
+    _terraform_env,
 )
 
 
+class FakeStreamReader:
+    """Stand-in for the asyncio.StreamReader of a subprocess pipe."""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, n: int = -1) -> bytes:
+        return self._buffer.read(n)
+
+
+def terraform_process(stdout: bytes = b"", stderr: bytes = b"", returncode: int = 0) -> MagicMock:
+    """Mock an asyncio terraform process."""
+    process = MagicMock(stdout=FakeStreamReader(stdout), returncode=returncode)
+    process.communicate = AsyncMock(return_value=(stdout, stderr))
+    process.wait = AsyncMock(return_value=returncode)
+    return process
+
+
 class TestTerraformParse(unittest.TestCase):
     def setUp(self):
+        # Keep the provider plugin cache out of the home directory
+        self.plugin_cache = tempfile.TemporaryDirectory()
+        self.addCleanup(self.plugin_cache.cleanup)
+        plugin_cache_patcher = patch("tfsec.parse.PLUGIN_CACHE_DIR", Path(self.plugin_cache.name))
+        plugin_cache_patcher.start()
+        self.addCleanup(plugin_cache_patcher.stop)
+        env_patcher = patch.dict(os.environ)
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        os.environ.pop("TF_PLUGIN_CACHE_DIR", None)
+
         self.test_dir = Path("/fake/terraform/dir")
         self.sample_json = {
             "format_version": "1.0",
@@ -26,27 +73,44 @@ class TestTerraformParse(unittest.TestCase):
         }
 
     @patch("tfsec.parse.shutil.copy2")
-    @patch("tfsec.parse.subprocess.run")
+    @patch("tfsec.parse.os.link")
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
     @patch("pathlib.Path.exists")
     @patch("pathlib.Path.unlink")
-    def test_plan_with_state_file(self, mock_unlink, mock_exists, mock_run, mock_copy):
+    def test_plan_with_state_file(self, mock_unlink, mock_exists, mock_exec, mock_link, mock_copy):
         # Mock file operations
         mock_exists.return_value = True
 
         # Mock successful execution of all commands
-        mock_run.side_effect = [
-            MagicMock(returncode=0, stdout="Init success", stderr=""),
-            MagicMock(returncode=0, stdout="Plan success", stderr=""),
-            MagicMock(returncode=0, stdout=json.dumps(self.sample_json), stderr=""),
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
         ]
+        # The state file is in place before init starts
+        mock_link.side_effect = lambda *args: self.assertEqual(mock_exec.call_count, 0)
 
         result = run_terraform_plan(self.test_dir, self.test_state_file)
 
-        # Verify state file was copied and cleaned up
-        mock_copy.assert_called_once()
+        # Verify state file was linked and cleaned up
+        mock_link.assert_called_once_with(self.test_state_file, self.test_dir / "terraform.tfstate")
+        mock_copy.assert_not_called()
         mock_unlink.assert_called_once()
         self.assertEqual(result.return_code, 0)
 
+    def test_state_file_copied_across_devices(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            state_file = Path(tmp) / "state.tfstate"
+            state_file.write_text("{}")
+            target = Path(tmp) / "terraform.tfstate"
+
+            with patch("tfsec.parse.os.link", side_effect=OSError), \
+                    patch("tfsec.parse.os.symlink", side_effect=OSError):
+                _link_state_file(state_file, target)
+
+            self.assertFalse(target.is_symlink())
+            self.assertEqual(target.read_text(), "{}")
+
     def test_extract_changes_with_updates(self):
         changes = extract_changes(self.sample_resource_change)
 
@@ -55,6 +119,18 @@ class TestTerraformParse(unittest.TestCase):
         self.assertEqual(changes["source_ranges"]["before"], ["10.0.0.0/8"])
         self.assertEqual(changes["source_ranges"]["after"], ["0.0.0.0/0"])
 
+    def test_extract_changes_added_and_removed_keys(self):
+        changes = extract_changes({
+            "before": {"name": "test", "labels": None, "description": "old"},
+            "after": {"name": "test", "tags": {"env": "prod"}, "network": None},
+            "actions": ["update"],
+        })
+
+        self.assertEqual(changes, {
+            "description": {"before": "old", "after": None},
+            "tags": {"before": None, "after": {"env": "prod"}},
+        })
+
     def test_extract_changes_with_no_op(self):
         no_op_change = {
             "before": {"name": "test"},
@@ -65,15 +141,13 @@ class TestTerraformParse(unittest.TestCase):
         changes = extract_changes(no_op_change)
         self.assertIsNone(changes)
 
-    @patch("tfsec.parse.subprocess.run")
-    def test_successful_terraform_plan(self, mock_run):
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_successful_terraform_plan(self, mock_exec):
         # Mock successful execution of all commands
-        mock_run.side_effect = [
-            MagicMock(returncode=0, stdout="Init success", stderr=""),  # init
-            MagicMock(returncode=0, stdout="Plan success", stderr=""),  # plan
-            MagicMock(
-                returncode=0, stdout=json.dumps(self.sample_json), stderr=""
-            ),  # show
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
         ]
 
         result = run_terraform_plan(self.test_dir)
@@ -83,29 +157,230 @@ class TestTerraformParse(unittest.TestCase):
         self.assertEqual(result.stdout, "Plan success")
         self.assertIsNone(result.error)
 
-    @patch("tfsec.parse.subprocess.run")
-    def test_terraform_init_failure(self, mock_run):
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_plan_uses_plugin_cache(self, mock_exec):
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
+        ]
+
+        run_terraform_plan(self.test_dir)
+
+        for call in mock_exec.call_args_list:
+            self.assertEqual(call.kwargs["env"]["TF_PLUGIN_CACHE_DIR"], self.plugin_cache.name)
+            self.assertEqual(call.kwargs["env"]["CHECKPOINT_DISABLE"], "1")
+
+    @patch("tfsec.parse.os.cpu_count", return_value=4)
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_plan_parallelism(self, mock_exec, mock_cpu_count):
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
+        ]
+
+        run_terraform_plan(self.test_dir)
+        run_terraform_plan(self.test_dir, parallelism=5)
+
+        plans = [call.args for call in mock_exec.call_args_list if call.args[1] == "plan"]
+        self.assertIn("-parallelism=12", plans[0])
+        self.assertIn("-parallelism=5", plans[1])
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_plan_is_non_interactive(self, mock_exec):
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
+        ]
+
+        run_terraform_plan(self.test_dir)
+        run_terraform_plan(self.test_dir, safe_no_lock=False)
+
+        init_call = mock_exec.call_args_list[0]
+        self.assertEqual(init_call.kwargs["stdout"], asyncio.subprocess.DEVNULL)
+        self.assertEqual(init_call.kwargs["stderr"], asyncio.subprocess.PIPE)
+        init, plan, show, _, locked_plan, _ = [call.args for call in mock_exec.call_args_list]
+        self.assertIn("-input=false", init)
+        self.assertIn("-input=false", plan)
+        self.assertIn("-no-color", show)
+        self.assertIn("-lock=false", plan)
+        self.assertNotIn("-lock=false", locked_plan)
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_init_skipped_when_current(self, mock_exec):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            (directory / ".terraform" / "providers").mkdir(parents=True)
+            (directory / "main.tf").write_text("")
+            (directory / ".terraform.lock.hcl").write_text("provider {}")
+            os.utime(directory / "main.tf", (0, 0))
+            mock_exec.side_effect = [
+                terraform_process(b"Init success", returncode=0),  # init
+                terraform_process(b"Plan success", returncode=0),  # plan
+                terraform_process(json.dumps(self.sample_json).encode()),  # show
+                terraform_process(b"Plan success", returncode=0),  # plan
+                terraform_process(json.dumps(self.sample_json).encode()),  # show
+            ]
+
+            run_terraform_plan(directory)
+            self.assertTrue((directory / ".terraform" / INIT_STAMP_FILE).exists())
+            result = run_terraform_plan(directory)
+
+            commands = [call.args[1] for call in mock_exec.call_args_list]
+            self.assertEqual(commands, ["init", "plan", "show", "plan", "show"])
+            self.assertEqual(result.json_plan, self.sample_json)
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_init_rerun_when_stale_or_forced(self, mock_exec):
+        def start_process(*command, **kwargs):
+            if command[1] == "show":
+                return terraform_process(json.dumps(self.sample_json).encode())
+            return terraform_process()
+        mock_exec.side_effect = start_process
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            (directory / ".terraform" / "providers").mkdir(parents=True)
+            (directory / ".terraform.lock.hcl").write_text("provider {}")
+            (directory / "main.tf").write_text("")
+
+            run_terraform_plan(directory)
+            run_terraform_plan(directory)
+            # A configuration changed after the last init needs init again
+            future = time.time() + 60
+            os.utime(directory / "main.tf", (future, future))
+            run_terraform_plan(directory)
+            run_terraform_plan(directory, force_init=True)
+
+        commands = [call.args[1] for call in mock_exec.call_args_list if call.args[1] != "show"]
+        self.assertEqual(commands, ["init", "plan", "plan", "init", "plan", "init", "plan"])
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_init_rerun_when_module_or_json_config_changes(self, mock_exec):
+        def start_process(*command, **kwargs):
+            if command[1] == "show":
+                return terraform_process(json.dumps(self.sample_json).encode())
+            return terraform_process()
+        mock_exec.side_effect = start_process
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            (directory / ".terraform" / "modules").mkdir(parents=True)
+            (directory / ".terraform" / "providers").mkdir()
+            (directory / ".terraform.lock.hcl").write_text("provider {}")
+            (directory / "main.tf.json").write_text("{}")
+            (directory / "modules" / "web").mkdir(parents=True)
+            (directory / "modules" / "web" / "main.tf").write_text("")
+            (directory / ".terraform" / "modules" / "modules.json").write_text(json.dumps({"Modules": [
+                {"Key": "", "Source": "", "Dir": "."},
+                {"Key": "web", "Source": "./modules/web", "Dir": "modules/web"},
+                {"Key": "vpc", "Source": "registry.terraform.io/x/vpc/aws", "Dir": ".terraform/modules/vpc"},
+            ]}))
+
+            run_terraform_plan(directory)
+            run_terraform_plan(directory)
+            future = time.time() + 60
+            os.utime(directory / "modules" / "web" / "main.tf", (future, future))
+            run_terraform_plan(directory)
+            future += 60
+            os.utime(directory / "main.tf.json", (future, future))
+            run_terraform_plan(directory)
+
+        commands = [call.args[1] for call in mock_exec.call_args_list if call.args[1] != "show"]
+        self.assertEqual(commands, ["init", "plan", "plan", "init", "plan", "init", "plan"])
+
+    def test_existing_plugin_cache_respected(self):
+        os.environ["TF_PLUGIN_CACHE_DIR"] = "/custom/plugin-cache"
+        self.assertEqual(_terraform_env()["TF_PLUGIN_CACHE_DIR"], "/custom/plugin-cache")
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_run_terraform_plans(self, mock_exec):
+        def start_process(*command, cwd, **kwargs):
+            if command[1] == "plan":
+                return terraform_process(f"Planned {cwd}".encode())
+            if command[1] == "show":
+                return terraform_process(json.dumps(self.sample_json).encode())
+            return terraform_process()
+        mock_exec.side_effect = start_process
+        directories = [Path("/fake/a"), Path("/fake/b")]
+
+        results = asyncio.run(run_terraform_plans(directories))
+
+        self.assertEqual([result.stdout for result in results], ["Planned /fake/a", "Planned /fake/b"])
+        self.assertTrue(all(result.json_plan == self.sample_json for result in results))
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_run_terraform_plans_serializes_init(self, mock_exec):
+        running = {"init": 0, "plan": 0}
+        peak = {"init": 0, "plan": 0}
+
+        def start_process(*command, **kwargs):
+            if command[1] == "show":
+                return terraform_process(json.dumps(self.sample_json).encode())
+            process = terraform_process()
+
+            async def communicate():
+                running[command[1]] += 1
+                peak[command[1]] = max(peak[command[1]], running[command[1]])
+                await asyncio.sleep(0.01 if command[1] == "init" else 0.05)
+                running[command[1]] -= 1
+                return b"", b""
+            process.communicate = communicate
+            return process
+        mock_exec.side_effect = start_process
+
+        asyncio.run(run_terraform_plans([Path("/fake/a"), Path("/fake/b"), Path("/fake/c")]))
+
+        # The shared plugin cache only sees one init at a time, plans still overlap
+        self.assertEqual(peak["init"], 1)
+        self.assertGreater(peak["plan"], 1)
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_terraform_init_failure(self, mock_exec):
         # Mock terraform init failure
-        mock_run.side_effect = subprocess.CalledProcessError(
-            returncode=1,
-            cmd=["terraform", "init"],
-            output="Init failed",
-            stderr="Error initializing",
-        )
+        mock_exec.return_value = terraform_process(b"Init failed", b"Error initializing", returncode=1)
 
         result = run_terraform_plan(self.test_dir)
 
         self.assertEqual(result.return_code, 1)
         self.assertIsNone(result.json_plan)
         self.assertIsNotNone(result.error)
+        self.assertEqual(result.stderr, "Error initializing")
+
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_failed_plan_keeps_logs(self, mock_exec):
+        mock_exec.side_effect = [
+            terraform_process(returncode=0),  # init
+            terraform_process(stderr=b"Error: boom", returncode=1),  # plan
+            terraform_process(returncode=1),  # show
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = Path(tmp) / "plan.json"
+            result = run_terraform_plan(self.test_dir, output_file=output_file)
+            saved = load_plan_result(output_file)
+
+        # The plan failed without an error from tfsec itself, its logs are needed to diagnose it
+        self.assertIsNone(result.error)
+        self.assertTrue(result.failed)
+        self.assertEqual(saved.stderr, "Error: boom")
+        self.assertEqual(saved.return_code, 1)
 
-    @patch("tfsec.parse.subprocess.run")
-    def test_invalid_json_output(self, mock_run):
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_invalid_json_output(self, mock_exec):
         # Mock successful commands but invalid JSON output
-        mock_run.side_effect = [
-            MagicMock(returncode=0, stdout="Init success", stderr=""),  # init
-            MagicMock(returncode=0, stdout="Plan success", stderr=""),  # plan
-            MagicMock(returncode=0, stdout="Invalid JSON", stderr=""),  # show
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Plan success", returncode=0),  # plan
+            terraform_process(b"Invalid JSON"),  # show
         ]
 
         result = run_terraform_plan(self.test_dir)
@@ -114,15 +389,13 @@ class TestTerraformParse(unittest.TestCase):
         self.assertIsNone(result.json_plan)
         self.assertTrue("Failed to parse JSON" in result.error)
 
-    @patch("tfsec.parse.subprocess.run")
-    def test_plan_with_changes(self, mock_run):
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_plan_with_changes(self, mock_exec):
         # Mock terraform plan indicating changes (return code 2)
-        mock_run.side_effect = [
-            MagicMock(returncode=0, stdout="Init success", stderr=""),  # init
-            MagicMock(returncode=2, stdout="Changes pending", stderr=""),  # plan
-            MagicMock(
-                returncode=0, stdout=json.dumps(self.sample_json), stderr=""
-            ),  # show
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Changes pending", returncode=2),  # plan
+            terraform_process(json.dumps(self.sample_json).encode()),  # show
         ]
 
         result = run_terraform_plan(self.test_dir)
@@ -131,6 +404,60 @@ class TestTerraformParse(unittest.TestCase):
         self.assertEqual(result.stdout, "Changes pending")
         self.assertEqual(result.json_plan, self.sample_json)
 
+    @unittest.skipUnless(STREAMING_AVAILABLE, "requires ijson")
+    @patch("tfsec.parse.asyncio.create_subprocess_exec")
+    def test_plan_with_streamed_changes(self, mock_exec):
+        plan = dict(self.sample_json, resource_changes=[
+            {
+                "address": "test_resource",
+                "type": "test_type",
+                "name": "test",
+                "change": self.sample_resource_change,
+            },
+            {
+                "address": "unchanged_resource",
+                "type": "test_type",
+                "name": "unchanged",
+                "change": {"before": {}, "after": {}, "actions": ["no-op"]},
+            },
+        ])
+        mock_exec.side_effect = [
+            terraform_process(b"Init success", returncode=0),  # init
+            terraform_process(b"Changes pending", returncode=2),  # plan
+            terraform_process(json.dumps(plan).encode()),  # show
+        ]
+
+        result = run_terraform_plan(self.test_dir, stream_changes=True)
+
+        self.assertIsNone(result.json_plan)
+        self.assertEqual(result.changes, create_resource_changes_dict(plan))
+        self.assertEqual(list(result.changes), ["test_resource"])
+
+    def test_plan_result_truncates_logs(self):
+        result = TerraformPlanResult(
+            stdout="x" * MAX_LOG_CHARS + "Error: end of log",
+            stderr="short",
+            json_plan=None,
+            return_code=1,
+        )
+
+        self.assertTrue(result.stdout_truncated)
+        self.assertEqual(len(result.stdout), MAX_LOG_CHARS)
+        self.assertTrue(result.stdout.endswith("Error: end of log"))
+        self.assertFalse(result.stderr_truncated)
+        with self.assertRaises(FrozenInstanceError):
+            result.stdout = ""
+
+        # Only the end of long output is decoded, a character cut in half is dropped with truncation
+        multibyte = _decode("é".encode() * (4 * MAX_LOG_CHARS))
+        self.assertLess(len(multibyte), 4 * MAX_LOG_CHARS)
+        multibyte_result = TerraformPlanResult(stdout=multibyte, stderr="", json_plan=None, return_code=1)
+        self.assertEqual(multibyte_result.stdout, "é" * MAX_LOG_CHARS)
+
+        data = result.to_dict(include_logs=False)
+        self.assertEqual(data["stdout"], "")
+        self.assertEqual(TerraformPlanResult.from_dict(data).stdout, "")
+
     def test_create_resource_changes_dict(self):
         sample_plan = {
             "resource_changes": [
@@ -156,6 +483,152 @@ class TestTerraformParse(unittest.TestCase):
             changes["test_resource"]["changes"]["source_ranges"]["after"], ["0.0.0.0/0"]
         )
 
+    def test_load_plan_result_caches_changes(self):
+        plan = {
+            "resource_changes": [
+                {
+                    "address": "test_resource",
+                    "type": "test_type",
+                    "name": "test",
+                    "change": self.sample_resource_change,
+                }
+            ]
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            plan_file = Path(tmp) / "plan.json"
+            save_plan_result(TerraformPlanResult("", "", plan, 2), plan_file)
+
+            with patch("tfsec.parse.CHANGES_CACHE_DIR", Path(tmp) / "changes-cache"):
+                first = load_plan_result(plan_file, use_cache=True)
+                with patch("tfsec.parse.create_resource_changes_dict") as mock_create:
+                    second = load_plan_result(plan_file, use_cache=True)
+
+        mock_create.assert_not_called()
+        self.assertEqual(first.changes, create_resource_changes_dict(plan))
+        self.assertEqual(second.changes, first.changes)
+        self.assertIsNone(second.json_plan)
+        self.assertEqual(second.return_code, 2)
+
+    def test_load_plan_result_cache_invalidation(self):
+        plan = {"resource_changes": [{"address": "test_resource", "change": self.sample_resource_change}]}
+        with tempfile.TemporaryDirectory() as tmp:
+            plan_file = Path(tmp) / "plan.json"
+            save_plan_result(TerraformPlanResult("", "", plan, 2), plan_file)
+            cache_dir = Path(tmp) / "changes-cache"
+
+            with patch("tfsec.parse.CHANGES_CACHE_DIR", cache_dir):
+                load_plan_result(plan_file, use_cache=True)
+                # Entries of another cache format are not reused
+                with patch("tfsec.parse.CHANGES_CACHE_FORMAT", 2):
+                    reformatted = load_plan_result(plan_file, use_cache=True)
+                self.assertIsNotNone(reformatted.json_plan)
+                self.assertEqual(len(list(cache_dir.iterdir())), 2)
+
+                # Expired entries are not reused and are pruned
+                for entry in cache_dir.iterdir():
+                    os.utime(entry, (0, 0))
+                expired = load_plan_result(plan_file, use_cache=True)
+                self.assertIsNotNone(expired.json_plan)
+                self.assertEqual(len(list(cache_dir.iterdir())), 1)
+
+    def test_prune_cache_keeps_newest_entries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = Path(tmp)
+            for age in range(5):
+                entry = cache_dir / f"{age}.json"
+                entry.write_text("{}")
+                os.utime(entry, (time.time() - age, time.time() - age))
+
+            prune_cache(cache_dir, max_entries=3)
+
+            self.assertEqual(sorted(entry.name for entry in cache_dir.iterdir()), ["0.json", "1.json", "2.json"])
+
+    def test_filter_security_relevant(self):
+        changes = {
+            "google_compute_firewall.web": {
+                "type": "google_compute_firewall",
+                "name": "web",
+                "action": ["update"],
+                "changes": {
+                    "source_ranges": {"before": ["10.0.0.0/8"], "after": ["0.0.0.0/0"]},
+                    "description": {"before": "old", "after": "new"},
+                },
+            },
+            "google_compute_disk.tagged": {
+                "type": "google_compute_disk",
+                "name": "tagged",
+                "action": ["update"],
+                "changes": {"labels": {"before": None, "after": {"team": "web"}}},
+            },
+            "random_id.suffix": {
+                "type": "random_id",
+                "name": "suffix",
+                "action": ["create"],
+                "changes": {"byte_length": {"before": None, "after": 4}},
+            },
+            "google_storage_object.public": {
+                "type": "google_storage_object",
+                "name": "public",
+                "action": ["update"],
+                "changes": {"predefined_acl": {"before": None, "after": "publicRead"}},
+            },
+        }
+
+        relevant = filter_security_relevant(changes)
+
+        self.assertEqual(
+            list(relevant), ["google_compute_firewall.web", "google_storage_object.public"]
+        )
+        self.assertEqual(
+            list(relevant["google_compute_firewall.web"]["changes"]), ["source_ranges"]
+        )
+
+    def test_filter_keeps_unknown_resource_types(self):
+        changed_attributes = {
+            "google_container_cluster": "master_authorized_networks_config",
+            "aws_lambda_function": "environment",
+            "azurerm_kubernetes_cluster": "api_server_authorized_ip_ranges",
+            "aws_db_instance": "backup_retention_period",
+            "random_password": "length",
+        }
+        changes = {
+            f"{resource_type}.this": {
+                "type": resource_type,
+                "name": "this",
+                "action": ["update"],
+                "changes": {attribute: {"before": None, "after": "changed"}},
+            }
+            for resource_type, attribute in changed_attributes.items()
+        }
+
+        relevant = filter_security_relevant(changes)
+
+        self.assertEqual(list(relevant), list(changes))
+
+    def test_deduplicate_changes(self):
+        tagged = {
+            "type": "google_compute_instance",
+            "action": ["update"],
+            "changes": {"can_ip_forward": {"before": False, "after": True}},
+        }
+        changes = {
+            "module.a.google_compute_instance.vm": dict(tagged, name="vm"),
+            "module.b.google_compute_instance.vm": dict(tagged, name="vm"),
+            "google_compute_instance.other": dict(tagged, name="other", action=["create"]),
+        }
+
+        representatives, groups = deduplicate_changes(changes)
+
+        self.assertEqual(
+            list(representatives),
+            ["module.a.google_compute_instance.vm", "google_compute_instance.other"],
+        )
+        self.assertEqual(
+            groups["module.a.google_compute_instance.vm"],
+            ["module.a.google_compute_instance.vm", "module.b.google_compute_instance.vm"],
+        )
+        self.assertEqual(groups["google_compute_instance.other"], ["google_compute_instance.other"])
+
 
 if __name__ == "__main__":
     unittest.main()